@@ -1,8 +1,10 @@
 from itemadapter import ItemAdapter
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient
 
 
 class MongoPipeline:
+    collection_name = "companies"
+
     def __init__(self, mongo_uri, mongo_db):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
@@ -17,13 +19,29 @@ class MongoPipeline:
     def open_spider(self, spider):
         self.client = MongoClient(self.mongo_uri)
         self.db = self.client[self.mongo_db]
+        self.ensure_indexes(self.db[self.collection_name])
 
     def close_spider(self, spider):
         self.client.close()
 
+    def ensure_indexes(self, collection):
+        # create_index is a no-op when the index already exists
+        collection.create_index(
+            [("enterprise_number", ASCENDING)], unique=True, name="enterprise_number"
+        )
+        for version in ("2025", "2008", "2003"):
+            collection.create_index(
+                [(f"nace_codes.{version}.code", ASCENDING)],
+                name=f"nace_codes_{version}",
+            )
+        collection.create_index([("functions.name", ASCENDING)], name="function_name")
+        collection.create_index(
+            [("publications.date", ASCENDING)], name="publication_date"
+        )
+
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
-        self.db["companies"].update_one(
+        self.db[self.collection_name].update_one(
             {"enterprise_number": adapter["enterprise_number"]},
             {"$set": adapter.asdict()},
             upsert=True,
@@ -0,0 +1,58 @@
+from pymongo import MongoClient
+
+from tp.pipelines import MongoPipeline
+
+
+# Fields returned by default, so lookups do not pull the whole document
+DEFAULT_PROJECTION = {
+    "_id": 0,
+    "enterprise_number": 1,
+    "general_info": 1,
+}
+
+
+class CompanyQueries:
+    def __init__(self, mongo_uri="mongodb://localhost:27017", mongo_db="scrapy_tp"):
+        self.client = MongoClient(mongo_uri)
+        self.collection = self.client[mongo_db][MongoPipeline.collection_name]
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            mongo_uri=settings.get("MONGO_URI", "mongodb://localhost:27017"),
+            mongo_db=settings.get("MONGO_DATABASE", "scrapy_tp"),
+        )
+
+    def close(self):
+        self.client.close()
+
+    def by_enterprise_number(self, enterprise_number, projection=None):
+        return self.collection.find_one(
+            {"enterprise_number": enterprise_number},
+            projection or DEFAULT_PROJECTION,
+        )
+
+    def by_nace_code(self, code, version=None, projection=None):
+        versions = [version] if version else ["2025", "2008", "2003"]
+        query = {"$or": [{f"nace_codes.{v}.code": code} for v in versions]}
+        return list(
+            self.collection.find(
+                query, projection or {**DEFAULT_PROJECTION, "nace_codes": 1}
+            )
+        )
+
+    def by_director(self, name, projection=None):
+        return list(
+            self.collection.find(
+                {"functions.name": name},
+                projection or {**DEFAULT_PROJECTION, "functions": 1},
+            )
+        )
+
+    def by_publication_date(self, date, projection=None):
+        return list(
+            self.collection.find(
+                {"publications.date": date},
+                projection or {**DEFAULT_PROJECTION, "publications": 1},
+            )
+        )
@@ -3,6 +3,7 @@ import csv
 import os
 from tp.items import KboItem
 from scrapy.http import Request
+from w3lib.url import add_or_replace_parameter
 import time
 
 
@@ -10,8 +11,21 @@ class KboSpider(scrapy.Spider):
     name = "kbo"
     allowed_domains = ["kbopub.economie.fgov.be"]
 
-    def __init__(self, *args, **kwargs):
+    # Query parameter set by the "klikbtw2008" toggle to render the NACE
+    # 2008 and 2003 activities server-side
+    nace_history_param = "toonbtw"
+
+    def __init__(self, link_depth=0, *args, **kwargs):
         super(KboSpider, self).__init__(*args, **kwargs)
+        # Partial results per enterprise number, waiting for both the main
+        # page and the NACE history page before the item is yielded
+        self.pending_items = {}
+        # Number of "Liens entre entités" hops to follow from the CSV
+        # enterprises (scrapy crawl kbo -a link_depth=2), 0 disables it
+        self.link_depth = int(link_depth)
+        # Enterprise numbers (digits only) already scheduled, so each entity
+        # is fetched once however dense the link graph is
+        self.seen_enterprises = set()
 
     def start_requests(self, limit=5):
         base_dir = os.path.dirname(
@@ -28,20 +42,58 @@ class KboSpider(scrapy.Spider):
                         break
 
                     enterprise_number = row["EnterpriseNumber"]
-                    enterprise_number_clean = enterprise_number.replace(".", "")
-                    url = f"https://kbopub.economie.fgov.be/kbopub/toonondernemingps.html?ondernemingsnummer={enterprise_number_clean}&lang=fr"
-
-                    yield Request(
-                        url=url,
-                        callback=self.parse,
-                        meta={"enterprise_number": enterprise_number},
-                    )
+                    requests = self.enterprise_requests(enterprise_number, 0)
+                    if not requests:
+                        continue
+
+                    yield from requests
                     count += 1
         except Exception as e:
             self.logger.error(f"Erreur lors de la lecture du CSV: {str(e)}")
 
+    def enterprise_requests(self, enterprise_number, link_depth):
+        enterprise_number_clean = enterprise_number.replace(".", "")
+        if enterprise_number_clean.zfill(10) in self.seen_enterprises:
+            return []
+        self.seen_enterprises.add(enterprise_number_clean.zfill(10))
+
+        url = f"https://kbopub.economie.fgov.be/kbopub/toonondernemingps.html?ondernemingsnummer={enterprise_number_clean}&lang=fr"
+
+        return [
+            Request(
+                url=url,
+                callback=self.parse,
+                errback=self.enterprise_failed,
+                meta={
+                    "enterprise_number": enterprise_number,
+                    "link_depth": link_depth,
+                },
+            ),
+            self.nace_history_request(url, enterprise_number),
+        ]
+
+    def follow_entity_links(self, item, link_depth):
+        if link_depth >= self.link_depth:
+            return
+
+        for link in item["entity_links"]:
+            enterprise_number = self._format_enterprise_number(
+                link.get("enterprise_number", "")
+            )
+            if not enterprise_number:
+                continue
+
+            requests = self.enterprise_requests(enterprise_number, link_depth + 1)
+            if requests:
+                self.logger.info(
+                    f"Entité liée ajoutée (profondeur {link_depth + 1}): {enterprise_number}"
+                )
+            yield from requests
+
     def parse(self, response):
         self.logger.info(f"Traitement de la page: {response.url}")
+        enterprise_number = response.meta["enterprise_number"]
+        item = None
 
         if "toonondernemingps" in response.url:
             self.logger.info("Page d'entreprise correcte détectée")
@@ -52,8 +104,9 @@ class KboSpider(scrapy.Spider):
 
                 self.logger.info(f"Fonctions extraites: {len(item['functions'])}")
 
-                # Process the item directly or yield it
-                yield item
+                yield from self.follow_entity_links(
+                    item, response.meta.get("link_depth", 0)
+                )
 
             except Exception as e:
                 self.logger.error(f"Erreur lors du traitement des données: {str(e)}")
@@ -63,6 +116,71 @@ class KboSpider(scrapy.Spider):
         else:
             self.logger.error(f"Page incorrecte: {response.url}")
 
+        item = self._merge_partial(enterprise_number, "item", item)
+        if item is not None:
+            yield item
+
+    def nace_history_request(self, url, enterprise_number):
+        history_url = add_or_replace_parameter(url, self.nace_history_param, "true")
+        return Request(
+            url=history_url,
+            callback=self.parse_nace_history,
+            errback=self.nace_history_failed,
+            meta={"enterprise_number": enterprise_number},
+            dont_filter=True,
+        )
+
+    def parse_nace_history(self, response):
+        enterprise_number = response.meta["enterprise_number"]
+        nace_history = {}
+
+        try:
+            nace_history = self.extract_nace_history(response)
+            self.logger.info(
+                f"Historique NACE {enterprise_number}: "
+                f"{len(nace_history['2008'])} codes 2008, "
+                f"{len(nace_history['2003'])} codes 2003"
+            )
+        except Exception as e:
+            self.logger.error(f"Erreur lors de l'extraction NACE 2008/2003: {str(e)}")
+
+        item = self._merge_partial(enterprise_number, "nace_history", nace_history)
+        if item is not None:
+            yield item
+
+    def enterprise_failed(self, failure):
+        enterprise_number = failure.request.meta["enterprise_number"]
+        self.logger.error(f"Échec de la requête {failure.request.url}: {failure.value}")
+        self._merge_partial(enterprise_number, "item", None)
+
+    def nace_history_failed(self, failure):
+        enterprise_number = failure.request.meta["enterprise_number"]
+        self.logger.warning(
+            f"Échec de la requête NACE 2008/2003 {failure.request.url}: {failure.value}"
+        )
+        item = self._merge_partial(enterprise_number, "nace_history", {})
+        if item is not None:
+            yield item
+
+    def _merge_partial(self, enterprise_number, key, value):
+        parts = self.pending_items.setdefault(enterprise_number, {})
+        parts[key] = value
+
+        if "item" not in parts or "nace_history" not in parts:
+            return None
+
+        del self.pending_items[enterprise_number]
+        item = parts["item"]
+        if item is None:
+            return None
+
+        # Codes found in the main page take precedence over the history page
+        for version, codes in parts["nace_history"].items():
+            if not item["nace_codes"].get(version):
+                item["nace_codes"][version] = codes
+
+        return item
+
     def parse_enterprise(self, response):
         item = KboItem()
         item["enterprise_number"] = response.meta["enterprise_number"]
@@ -222,55 +340,52 @@ class KboSpider(scrapy.Spider):
     def extract_nace_codes(self, response):
         nace_codes = {"2025": [], "2008": [], "2003": []}
 
-        # Extract NACE 2025 TVA codes
-        nace_2025_tva_section = response.xpath(
-            '//tr[td/h2[contains(text(), "Activités TVA Code Nacebel version 2025")]]/following-sibling::tr'
-        )
-        for row in nace_2025_tva_section:
-            if (
-                row.xpath("./td/h2").get()
-                or row.xpath('.//span[@id="klikbtw2008"]').get()
-            ):
-                break
+        for version in nace_codes:
+            for code_type in ("TVA", "ONSS"):
+                nace_codes[version].extend(
+                    self._extract_nace_section(response, code_type, version)
+                )
 
-            code_texts = row.xpath('./td[contains(@class, "QL")]//text()').getall()
-            if code_texts:
-                code_text = " ".join([t.strip() for t in code_texts if t.strip()])
-                if "TVA 2025" in code_text:
-                    parts = code_text.split("-", 1)
-                    if len(parts) > 1:
-                        code_part = parts[0].strip()
-                        code_number = (
-                            code_part.split()[-1].strip()
-                            if len(code_part.split()) > 1
-                            else ""
-                        )
-                        description = parts[1].strip()
-                        nace_codes["2025"].append(
-                            {
-                                "type": "TVA",
-                                "code": code_number,
-                                "description": description,
-                                "date": self._extract_date_from_text(code_text),
-                            }
-                        )
-                        self.logger.info(f"Code NACE TVA 2025 trouvé: {code_text}")
+        # NACE 2008 and 2003 codes are only present here when the page was
+        # served with the toggle content; otherwise they come from the
+        # request scheduled by nace_history_request
+        if not nace_codes["2008"] and not nace_codes["2003"]:
+            self.logger.info(
+                "Codes NACE 2008 et 2003 absents de la page, en attente de la requête dédiée"
+            )
 
-        # Extract NACE 2025 ONSS codes
-        nace_2025_onss_section = response.xpath(
-            '//tr[td/h2[contains(text(), "Activités ONSS Code Nacebel version 2025")]]/following-sibling::tr'
+        return nace_codes
+
+    def extract_nace_history(self, response):
+        nace_history = {"2008": [], "2003": []}
+
+        for version in nace_history:
+            for code_type in ("TVA", "ONSS"):
+                nace_history[version].extend(
+                    self._extract_nace_section(response, code_type, version)
+                )
+
+        return nace_history
+
+    def _extract_nace_section(self, response, code_type, version):
+        codes = []
+
+        section = response.xpath(
+            f'//tr[td/h2[contains(text(), "Activités {code_type} Code Nacebel version {version}")]]/following-sibling::tr'
         )
-        for row in nace_2025_onss_section:
+        marker = f"{code_type}{version}"
+
+        for row in section:
             if (
                 row.xpath("./td/h2").get()
-                or row.xpath('.//span[@id="klikbtw2008"]').get()
+                or row.xpath('.//span[starts-with(@id, "klik")]').get()
             ):
                 break
 
             code_texts = row.xpath('./td[contains(@class, "QL")]//text()').getall()
             if code_texts:
                 code_text = " ".join([t.strip() for t in code_texts if t.strip()])
-                if "ONSS2025" in code_text:
+                if marker in code_text.replace(" ", ""):
                     parts = code_text.split("-", 1)
                     if len(parts) > 1:
                         code_part = parts[0].strip()
@@ -280,23 +395,19 @@ class KboSpider(scrapy.Spider):
                             else ""
                         )
                         description = parts[1].strip()
-                        nace_codes["2025"].append(
+                        codes.append(
                             {
-                                "type": "ONSS",
+                                "type": code_type,
                                 "code": code_number,
                                 "description": description,
                                 "date": self._extract_date_from_text(code_text),
                             }
                         )
-                        self.logger.info(f"Code NACE ONSS 2025 trouvé: {code_text}")
-
-        # Note: NACE 2008 and 2003 codes would require JavaScript interaction
-        # which is not possible with standard Scrapy requests
-        self.logger.info(
-            "Les codes NACE 2008 et 2003 ne sont pas extraits sans Selenium"
-        )
+                        self.logger.info(
+                            f"Code NACE {code_type} {version} trouvé: {code_text}"
+                        )
 
-        return nace_codes
+        return codes
 
     def extract_financial_data(self, response):
         financial_data = {}
@@ -377,6 +488,14 @@ class KboSpider(scrapy.Spider):
 
         return external_links
 
+    def _format_enterprise_number(self, text):
+        digits = "".join(c for c in text if c.isdigit())
+        if len(digits) == 9:
+            digits = "0" + digits
+        if len(digits) != 10:
+            return ""
+        return f"{digits[:4]}.{digits[4:7]}.{digits[7:]}"
+
     def _extract_date_from_text(self, text):
         if "Depuis le" in text:
             date_part = text.split("Depuis le")[1].strip()